@@ -3,11 +3,17 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QFormLayout, QLabel, QLineEdit, QPushButton, QComboBox,
     QMessageBox, QDialog, QTreeWidget, QTreeWidgetItem, QHeaderView,
-    QCheckBox, QFileDialog, QSizePolicy
+    QCheckBox, QFileDialog, QSizePolicy, QListWidget, QListWidgetItem, QStyle
 )
-from PyQt5.QtCore import QDate, Qt
+from PyQt5.QtCore import QDate, Qt, QObject, QRunnable, QThreadPool, QSize, QUrl, pyqtSignal
+from PyQt5.QtGui import QImageReader, QPixmap, QIcon, QDesktopServices
 from datetime import datetime, timedelta
 import re
+import os
+import hashlib
+import mimetypes
+import shutil
+import tempfile
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
@@ -15,6 +21,63 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.enums import TA_CENTER
 
 
+class ThumbnailSignals(QObject):
+    """Sinais do ThumbnailWorker (QRunnable não herda de QObject e não pode emitir sinais)."""
+    finished = pyqtSignal(str, str)
+
+
+class ThumbnailWorker(QRunnable):
+    """Gera a miniatura de um anexo em segundo plano e a grava no cache em disco.
+
+    Usa QImage/QImageReader, que podem ser usados fora da thread da interface
+    (QPixmap não). Ao terminar emite o hash do anexo e o caminho da miniatura,
+    ou uma string vazia se o arquivo não puder ser lido como imagem.
+    """
+
+    def __init__(self, file_hash, source_path, thumb_path, size=128):
+        super().__init__()
+        self.file_hash = file_hash
+        self.source_path = source_path
+        self.thumb_path = thumb_path
+        self.size = size
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        # Uma exceção não tratada dentro de QRunnable.run encerra o aplicativo (qFatal)
+        try:
+            if not os.path.exists(self.thumb_path):
+                self.generate_thumbnail()
+        except OSError as e:
+            print(f"Não foi possível gerar a miniatura de '{self.source_path}': {e}")
+            self.signals.finished.emit(self.file_hash, "")
+            return
+
+        self.signals.finished.emit(self.file_hash, self.thumb_path if os.path.exists(self.thumb_path) else "")
+
+    def generate_thumbnail(self):
+        """Decodifica a imagem na escala da miniatura e a grava no cache de forma atômica."""
+        reader = QImageReader(self.source_path)
+        reader.setAutoTransform(True)
+        original_size = reader.size()
+        if original_size.isValid():
+            # Decodifica já na escala reduzida, sem carregar a foto inteira na memória
+            reader.setScaledSize(original_size.scaled(self.size, self.size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return
+
+        thumb_dir = os.path.dirname(self.thumb_path)
+        os.makedirs(thumb_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=thumb_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            if image.save(tmp_path, "PNG"):
+                os.replace(tmp_path, self.thumb_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
 class VisaApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -22,6 +85,14 @@ class VisaApp(QMainWindow):
         self.setGeometry(100, 100, 1000, 700)
 
         self.db_name = "visa_bd.db"
+        self.anexos_dir = "visa_anexos"
+        self.arquivo_db_name = "visa_arquivo.db"
+        self.arquivo_anexado = False
+        self.filtro_atual = (None, None)
+        self.anexo_items = {}
+        self.thumbnails_em_andamento = set()
+        self.thumbnails_com_falha = set()
+        self.limpezas_pendentes = set()
         self.conn = None
         self.cursor = None
         self.init_db()
@@ -65,9 +136,30 @@ class VisaApp(QMainWindow):
                 )
                 """
             )
+            # Apenas os metadados dos anexos ficam no banco; o conteúdo fica em
+            # self.anexos_dir, endereçado pelo hash SHA-256 (ver armazenar_arquivo).
+            self.cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS anexos (
+                    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                    estabelecimento_id INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    nome_arquivo TEXT NOT NULL,
+                    tipo TEXT,
+                    tamanho INTEGER,
+                    Data_inspecao TEXT,
+                    data_anexo TEXT,
+                    UNIQUE (estabelecimento_id, hash)
+                )
+                """
+            )
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_anexos_estabelecimento ON anexos (estabelecimento_id)"
+            )
             self.conn.commit()
-            print("Banco de dados 'visa_bd.db' e tabela 'estabelecimentos' verificados/criados.")
-        except sqlite3.Error as e:
+            os.makedirs(self.anexos_dir, exist_ok=True)
+            print("Banco de dados 'visa_bd.db' e tabelas 'estabelecimentos' e 'anexos' verificados/criados.")
+        except (sqlite3.Error, OSError) as e:
             QMessageBox.critical(self, "Erro no Banco de Dados", f"Erro ao inicializar o banco de dados: {e}")
             self.close()
 
@@ -334,6 +426,10 @@ class VisaApp(QMainWindow):
         btn_salvar_inspecao.clicked.connect(lambda: self.salvar_inspecao(dialog))
         layout.addWidget(btn_salvar_inspecao)
 
+        btn_anexos = QPushButton("Anexos (fotos e documentos)")
+        btn_anexos.clicked.connect(lambda: self.open_anexos_window(dialog, self.current_establishment_id))
+        layout.addWidget(btn_anexos)
+
         dialog.exec_()
 
     def load_estabelecimento_for_inspection(self, parent_window):
@@ -447,6 +543,513 @@ class VisaApp(QMainWindow):
         except sqlite3.Error as e:
             QMessageBox.critical(window, "Erro ao Salvar", f"Erro ao salvar dados da inspeção: {e}")
 
+    # --- Funções para Anexos ---
+    def anexo_path(self, file_hash):
+        """Retorna o caminho do conteúdo de um anexo no repositório (ex: visa_anexos/ab/abcd...)."""
+        return os.path.join(self.anexos_dir, file_hash[:2], file_hash)
+
+    def thumbnail_path(self, file_hash):
+        """Retorna o caminho da miniatura de um anexo no cache em disco."""
+        return os.path.join(self.anexos_dir, "miniaturas", f"{file_hash}.png")
+
+    def armazenar_arquivo(self, source_path):
+        """
+        Copia um arquivo para o repositório de anexos, endereçado pelo hash SHA-256 do conteúdo.
+        O hash é calculado durante a cópia, então o arquivo de origem é lido uma única vez.
+        Se o mesmo conteúdo já estiver armazenado, a cópia temporária é descartada.
+        Retorna a tupla (hash, tamanho em bytes).
+        """
+        sha256 = hashlib.sha256()
+        tamanho = 0
+        # Copia para um temporário e só então renomeia, para nunca deixar
+        # um arquivo incompleto com o nome do hash.
+        fd, tmp_path = tempfile.mkstemp(dir=self.anexos_dir, suffix=".tmp")
+        try:
+            # Envolve o descritor antes de abrir a origem, para que ele seja fechado mesmo se a abertura falhar
+            with os.fdopen(fd, "wb") as dst, open(source_path, "rb") as src:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+                    dst.write(chunk)
+                    tamanho += len(chunk)
+
+            file_hash = sha256.hexdigest()
+            destino = self.anexo_path(file_hash)
+            if not os.path.exists(destino):
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(tmp_path, destino)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return file_hash, tamanho
+
+    def apagar_conteudo_se_orfao(self, file_hash):
+        """Apaga do disco o conteúdo e a miniatura de um hash que nenhum anexo (ativo ou arquivado) usa mais."""
+        if file_hash in self.thumbnails_em_andamento:
+            # O worker ainda lê o conteúdo e gravará a miniatura; a limpeza é refeita em on_thumbnail_ready
+            self.limpezas_pendentes.add(file_hash)
+            return
+
+        self.cursor.execute("SELECT COUNT(*) FROM anexos WHERE hash=?", (file_hash,))
+        if self.cursor.fetchone()[0]:
+            return
+        # Estabelecimentos arquivados continuam apontando para o mesmo repositório
+        if self.hash_em_uso_no_arquivo(file_hash):
+            return
+
+        for path in (self.anexo_path(file_hash), self.thumbnail_path(file_hash)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Não foi possível apagar '{path}': {e}")
+
+    def open_anexos_selecionado(self):
+        """Abre os anexos do estabelecimento selecionado na janela de pesquisa."""
+        parent_window = self.tree_widget.window()
+        selected_items = self.tree_widget.selectedItems()
+        if len(selected_items) != 1:
+            QMessageBox.warning(parent_window, "Anexos", "Por favor, selecione um único estabelecimento.")
+            return
+        item = selected_items[0]
+        schema = "arquivo" if item.data(0, Qt.UserRole) else "main"
+        self.open_anexos_window(parent_window, int(item.text(0)), schema=schema)
+
+    def open_anexos_window(self, parent_window, estabelecimento_id, schema="main"):
+        """
+        Abre a janela com os anexos (fotos, relatórios, projetos) de um estabelecimento.
+        Anexos de estabelecimentos arquivados (schema 'arquivo') são exibidos apenas para consulta.
+        """
+        if estabelecimento_id is None:
+            QMessageBox.warning(parent_window, "Erro", "Nenhum estabelecimento selecionado. Busque pelo CNPJ/CPF primeiro.")
+            return
+
+        dialog = QDialog(parent_window)
+        dialog.setWindowTitle("Anexos do Estabelecimento")
+        dialog.setGeometry(250, 250, 700, 500)
+        dialog.setModal(True)
+
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+
+        self.anexos_list = QListWidget()
+        self.anexos_list.setViewMode(QListWidget.IconMode)
+        self.anexos_list.setIconSize(QSize(128, 128))
+        self.anexos_list.setResizeMode(QListWidget.Adjust)
+        self.anexos_list.itemDoubleClicked.connect(lambda item: self.abrir_anexo(dialog, item))
+        layout.addWidget(self.anexos_list)
+
+        buttons_layout = QHBoxLayout()
+        if schema == "main":
+            buttons_layout.addWidget(QPushButton("Adicionar Anexos", clicked=lambda: self.adicionar_anexos(dialog, estabelecimento_id)))
+        buttons_layout.addWidget(QPushButton("Abrir", clicked=lambda: self.abrir_anexo(dialog)))
+        if schema == "main":
+            buttons_layout.addWidget(QPushButton("Remover", clicked=lambda: self.remover_anexo(dialog, estabelecimento_id)))
+        layout.addLayout(buttons_layout)
+
+        self.load_anexos(estabelecimento_id, schema)
+
+        dialog.exec_()
+        # Miniaturas que terminarem depois do fechamento da janela são ignoradas
+        self.anexo_items = {}
+
+    def load_anexos(self, estabelecimento_id, schema="main"):
+        """Carrega a lista de anexos e agenda a geração das miniaturas que ainda não estão em cache."""
+        self.anexos_list.clear()
+        self.anexo_items = {}
+
+        self.cursor.execute(
+            f"SELECT ID, hash, nome_arquivo, tipo, Data_inspecao FROM {schema}.anexos WHERE estabelecimento_id=? ORDER BY ID",
+            (estabelecimento_id,),
+        )
+        data = self.cursor.fetchall()
+
+        thread_pool = QThreadPool.globalInstance()
+        for anexo_id, file_hash, nome_arquivo, tipo, data_inspecao in data:
+            tipo = tipo or ""
+            item = QListWidgetItem(nome_arquivo)
+            item.setData(Qt.UserRole, (anexo_id, file_hash, nome_arquivo, tipo))
+            if data_inspecao:
+                item.setToolTip(f"{nome_arquivo}\nInspeção de {data_inspecao}")
+
+            thumb_path = self.thumbnail_path(file_hash)
+            if os.path.exists(thumb_path):
+                item.setIcon(QIcon(thumb_path))
+            elif tipo.startswith("image/") and file_hash not in self.thumbnails_com_falha:
+                item.setIcon(self.style().standardIcon(QStyle.SP_FileIcon))
+                self.anexo_items.setdefault(file_hash, []).append(item)
+                # Se já houver um worker para este hash, o item recebe o ícone quando ele terminar
+                if file_hash not in self.thumbnails_em_andamento:
+                    self.thumbnails_em_andamento.add(file_hash)
+                    worker = ThumbnailWorker(file_hash, self.anexo_path(file_hash), thumb_path)
+                    worker.signals.finished.connect(self.on_thumbnail_ready)
+                    thread_pool.start(worker)
+            else:
+                item.setIcon(self.style().standardIcon(QStyle.SP_FileIcon))
+
+            self.anexos_list.addItem(item)
+
+    def on_thumbnail_ready(self, file_hash, thumb_path):
+        """Atualiza o ícone dos itens cuja miniatura acabou de ser gerada em segundo plano."""
+        self.thumbnails_em_andamento.discard(file_hash)
+        if not thumb_path:
+            # Não tenta decodificar de novo a cada abertura da janela; o item fica com o ícone padrão
+            self.thumbnails_com_falha.add(file_hash)
+        for item in self.anexo_items.pop(file_hash, []):
+            if thumb_path:
+                item.setIcon(QIcon(thumb_path))
+
+        if file_hash in self.limpezas_pendentes:
+            self.limpezas_pendentes.discard(file_hash)
+            try:
+                self.apagar_conteudo_se_orfao(file_hash)
+            except sqlite3.Error as e:
+                print(f"Não foi possível limpar o repositório de anexos: {e}")
+
+    def adicionar_anexos(self, parent_window, estabelecimento_id):
+        """Adiciona um ou mais arquivos como anexos do estabelecimento."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            parent_window, "Selecionar Anexos", "",
+            "Imagens e Documentos (*.png *.jpg *.jpeg *.bmp *.gif *.pdf);;Todos os Arquivos (*)"
+        )
+        if not file_paths:
+            return
+
+        self.cursor.execute("SELECT Data_ultima_inspecao FROM estabelecimentos WHERE ID=?", (estabelecimento_id,))
+        row = self.cursor.fetchone()
+        data_inspecao = row[0] if row and row[0] else ""
+        data_anexo = datetime.now().strftime("%d/%m/%Y %H:%M")
+
+        hashes_armazenados = []
+        ignorados = []
+        try:
+            for file_path in file_paths:
+                file_hash, tamanho = self.armazenar_arquivo(file_path)
+                hashes_armazenados.append(file_hash)
+                nome_arquivo = os.path.basename(file_path)
+                tipo = mimetypes.guess_type(nome_arquivo)[0] or ""
+                # Um mesmo conteúdo anexado duas vezes ao estabelecimento é ignorado
+                self.cursor.execute(
+                    """
+                    INSERT OR IGNORE INTO anexos (
+                        estabelecimento_id, hash, nome_arquivo, tipo, tamanho, Data_inspecao, data_anexo
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (estabelecimento_id, file_hash, nome_arquivo, tipo, tamanho, data_inspecao, data_anexo),
+                )
+                if self.cursor.rowcount == 0:
+                    ignorados.append(nome_arquivo)
+            self.conn.commit()
+        except OSError as e:
+            self.conn.commit()
+            QMessageBox.critical(parent_window, "Erro ao Anexar", f"Erro ao copiar o arquivo: {e}")
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            # Os arquivos já copiados para o repositório não têm mais registro que os use
+            try:
+                for file_hash in set(hashes_armazenados):
+                    self.apagar_conteudo_se_orfao(file_hash)
+            except sqlite3.Error as cleanup_error:
+                print(f"Não foi possível limpar o repositório de anexos: {cleanup_error}")
+            QMessageBox.critical(parent_window, "Erro ao Anexar", f"Erro ao salvar o anexo: {e}")
+            ignorados = []
+
+        if ignorados:
+            QMessageBox.information(
+                parent_window, "Anexos Ignorados",
+                "Os seguintes arquivos já estavam anexados a este estabelecimento e foram ignorados:\n"
+                + "\n".join(ignorados)
+            )
+
+        self.load_anexos(estabelecimento_id)
+
+    def abrir_anexo(self, parent_window, item=None):
+        """Exibe a prévia de um anexo de imagem ou abre o documento no aplicativo padrão do sistema."""
+        if item is None:
+            item = self.anexos_list.currentItem()
+        if item is None:
+            QMessageBox.warning(parent_window, "Anexos", "Por favor, selecione um anexo.")
+            return
+
+        _, file_hash, nome_arquivo, tipo = item.data(Qt.UserRole)
+        file_path = self.anexo_path(file_hash)
+        if not os.path.exists(file_path):
+            QMessageBox.warning(parent_window, "Anexos", "Arquivo não encontrado no repositório de anexos.")
+            return
+
+        if tipo.startswith("image/"):
+            self.show_image_preview(parent_window, file_path, nome_arquivo)
+            return
+
+        # O repositório guarda o arquivo apenas pelo hash; o aplicativo externo
+        # precisa do nome original (e da extensão) para reconhecer o tipo.
+        try:
+            open_dir = os.path.join(tempfile.gettempdir(), "visa_anexos", file_hash)
+            os.makedirs(open_dir, exist_ok=True)
+            open_path = os.path.join(open_dir, nome_arquivo)
+            if not os.path.exists(open_path):
+                shutil.copyfile(file_path, open_path)
+        except OSError as e:
+            QMessageBox.critical(parent_window, "Anexos", f"Erro ao abrir o anexo: {e}")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(open_path)))
+
+    def show_image_preview(self, parent_window, file_path, nome_arquivo):
+        """Mostra a prévia de uma imagem, decodificada diretamente no tamanho da janela de prévia."""
+        preview_size = QSize(900, 650)
+        reader = QImageReader(file_path)
+        reader.setAutoTransform(True)
+        original_size = reader.size()
+        if original_size.isValid() and (
+            original_size.width() > preview_size.width() or original_size.height() > preview_size.height()
+        ):
+            reader.setScaledSize(original_size.scaled(preview_size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            QMessageBox.warning(parent_window, "Anexos", "Não foi possível exibir a imagem.")
+            return
+
+        dialog = QDialog(parent_window)
+        dialog.setWindowTitle(nome_arquivo)
+        dialog.setModal(True)
+
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+
+        label = QLabel()
+        label.setAlignment(Qt.AlignCenter)
+        label.setPixmap(QPixmap.fromImage(image))
+        layout.addWidget(label)
+
+        dialog.exec_()
+
+    def remover_anexo(self, parent_window, estabelecimento_id):
+        """Remove o anexo selecionado. O conteúdo só é apagado do disco se nenhum outro registro o usar."""
+        item = self.anexos_list.currentItem()
+        if item is None:
+            QMessageBox.warning(parent_window, "Anexos", "Por favor, selecione um anexo.")
+            return
+
+        anexo_id, file_hash, nome_arquivo, _ = item.data(Qt.UserRole)
+        resposta = QMessageBox.question(
+            parent_window, "Remover Anexo", f"Deseja remover o anexo '{nome_arquivo}'?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if resposta != QMessageBox.Yes:
+            return
+
+        try:
+            self.cursor.execute("DELETE FROM anexos WHERE ID=?", (anexo_id,))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            QMessageBox.critical(parent_window, "Erro ao Remover", f"Erro ao remover o anexo: {e}")
+            return
+
+        # O registro já foi removido; uma falha na limpeza do repositório não deve ser reportada como falha da remoção
+        try:
+            self.apagar_conteudo_se_orfao(file_hash)
+        except sqlite3.Error as e:
+            print(f"Não foi possível limpar o repositório de anexos: {e}")
+
+        self.load_anexos(estabelecimento_id)
+
+    # --- Funções para Arquivo de Estabelecimentos Inativos ---
+    def attach_arquivo(self):
+        """
+        Anexa (ATTACH) o banco de arquivo como schema 'arquivo', criando suas tabelas se necessário.
+
+        As tabelas do arquivo têm as mesmas colunas das tabelas principais, mas preservam
+        os IDs originais e não exigem CNPJ/CPF único, pois um estabelecimento pode ser
+        recadastrado e arquivado novamente.
+        """
+        if self.arquivo_anexado:
+            return
+
+        # ATTACH não pode ser executado dentro de uma transação
+        self.conn.commit()
+        self.cursor.execute("ATTACH DATABASE ? AS arquivo", (self.arquivo_db_name,))
+        self.arquivo_anexado = True
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS arquivo.estabelecimentos (
+                ID INTEGER PRIMARY KEY,
+                Estabelecimento TEXT NOT NULL,
+                CNPJ_CPF TEXT NOT NULL,
+                Grupo TEXT,
+                CNAE TEXT,
+                Grau_de_risco TEXT,
+                Responsavel TEXT,
+                CPF_Responsavel TEXT,
+                Endereco TEXT,
+                Telefone TEXT,
+                Email TEXT,
+                Projeto_Arquitetonico TEXT,
+                Data_ultima_inspecao TEXT,
+                Reinspecao TEXT,
+                Alvara TEXT,
+                Data_proxima_inspecao TEXT,
+                Situacao TEXT,
+                motivo TEXT
+            )
+            """
+        )
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS arquivo.anexos (
+                ID INTEGER PRIMARY KEY,
+                estabelecimento_id INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                nome_arquivo TEXT NOT NULL,
+                tipo TEXT,
+                tamanho INTEGER,
+                Data_inspecao TEXT,
+                data_anexo TEXT
+            )
+            """
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS arquivo.idx_anexos_estabelecimento ON anexos (estabelecimento_id)"
+        )
+        self.conn.commit()
+
+    def detach_arquivo(self):
+        """Desanexa (DETACH) o banco de arquivo, se estiver anexado."""
+        if not self.arquivo_anexado:
+            return
+        self.conn.commit()
+        self.cursor.execute("DETACH DATABASE arquivo")
+        self.arquivo_anexado = False
+
+    def hash_em_uso_no_arquivo(self, file_hash):
+        """Indica se algum anexo arquivado ainda usa o conteúdo com o hash informado."""
+        if not os.path.exists(self.arquivo_db_name):
+            return False
+
+        estava_anexado = self.arquivo_anexado
+        try:
+            self.attach_arquivo()
+            self.cursor.execute("SELECT COUNT(*) FROM arquivo.anexos WHERE hash=?", (file_hash,))
+            return self.cursor.fetchone()[0] > 0
+        finally:
+            if not estava_anexado:
+                self.detach_arquivo()
+
+    def toggle_incluir_arquivados(self, checked):
+        """Anexa ou desanexa o banco de arquivo conforme a opção da janela de pesquisa e recarrega a lista."""
+        try:
+            if checked:
+                self.attach_arquivo()
+            else:
+                self.detach_arquivo()
+        except sqlite3.Error as e:
+            # Mantém a opção coerente com o estado real do banco de arquivo
+            self.incluir_arquivados_checkbox.blockSignals(True)
+            self.incluir_arquivados_checkbox.setChecked(self.arquivo_anexado)
+            self.incluir_arquivados_checkbox.blockSignals(False)
+            QMessageBox.critical(self.tree_widget.window(), "Erro no Arquivo", f"Erro ao acessar o banco de arquivo: {e}")
+            return
+        self.load_data_to_tree(*self.filtro_atual)
+
+    def arquivar_selecionados(self):
+        """
+        Move os estabelecimentos selecionados (encerrados ou com cadastro baixado), e seus anexos,
+        para o banco de arquivo. A cópia e a remoção são feitas na mesma transação.
+
+        O ID do estabelecimento é preservado no arquivo. Se o mesmo registro já estiver arquivado
+        (por exemplo, após restaurar um backup do banco principal), a cópia arquivada é substituída
+        pela atual; se o ID arquivado pertencer a outro CNPJ/CPF, a operação é recusada.
+        """
+        parent_window = self.tree_widget.window()
+        ids = [
+            int(item.text(0)) for item in self.tree_widget.selectedItems()
+            if not item.data(0, Qt.UserRole)
+        ]
+        if not ids:
+            QMessageBox.warning(parent_window, "Arquivar", "Por favor, selecione os estabelecimentos ativos que deseja arquivar.")
+            return
+
+        resposta = QMessageBox.question(
+            parent_window, "Arquivar",
+            f"Mover {len(ids)} estabelecimento(s) e seus anexos para o arquivo de inativos?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if resposta != QMessageBox.Yes:
+            return
+
+        estabelecimentos_colunas = (
+            "ID, Estabelecimento, CNPJ_CPF, Grupo, CNAE, Grau_de_risco, Responsavel, CPF_Responsavel, "
+            "Endereco, Telefone, Email, Projeto_Arquitetonico, Data_ultima_inspecao, Reinspecao, "
+            "Alvara, Data_proxima_inspecao, Situacao, motivo"
+        )
+        # O ID dos anexos não é referenciado por nenhuma tabela; o arquivo gera o seu próprio
+        anexos_colunas = "estabelecimento_id, hash, nome_arquivo, tipo, tamanho, Data_inspecao, data_anexo"
+
+        placeholders = ", ".join("?" for _ in ids)
+        estava_anexado = self.arquivo_anexado
+        try:
+            self.attach_arquivo()
+            self.cursor.execute(
+                f"""
+                SELECT m.ID, m.CNPJ_CPF, a.CNPJ_CPF
+                FROM main.estabelecimentos m JOIN arquivo.estabelecimentos a ON a.ID = m.ID
+                WHERE m.ID IN ({placeholders}) AND a.CNPJ_CPF <> m.CNPJ_CPF
+                """,
+                ids,
+            )
+            conflitos = self.cursor.fetchall()
+            if conflitos:
+                detalhes = "\n".join(
+                    f"ID {id_}: {cnpj_atual} (no arquivo: {cnpj_arquivado})"
+                    for id_, cnpj_atual, cnpj_arquivado in conflitos
+                )
+                QMessageBox.warning(
+                    parent_window, "Arquivar",
+                    "Os IDs abaixo já pertencem a outro estabelecimento no arquivo. "
+                    "Verifique se o banco principal foi restaurado de um backup antigo.\n" + detalhes
+                )
+                return
+
+            self.cursor.execute(
+                f"""
+                INSERT OR REPLACE INTO arquivo.estabelecimentos ({estabelecimentos_colunas})
+                SELECT {estabelecimentos_colunas} FROM main.estabelecimentos WHERE ID IN ({placeholders})
+                """,
+                ids,
+            )
+            self.cursor.execute(
+                f"""
+                INSERT INTO arquivo.anexos ({anexos_colunas})
+                SELECT {anexos_colunas} FROM main.anexos m
+                WHERE m.estabelecimento_id IN ({placeholders})
+                AND NOT EXISTS (
+                    SELECT 1 FROM arquivo.anexos a
+                    WHERE a.estabelecimento_id = m.estabelecimento_id AND a.hash = m.hash
+                )
+                """,
+                ids,
+            )
+            self.cursor.execute(f"DELETE FROM main.anexos WHERE estabelecimento_id IN ({placeholders})", ids)
+            self.cursor.execute(f"DELETE FROM main.estabelecimentos WHERE ID IN ({placeholders})", ids)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            QMessageBox.critical(parent_window, "Erro ao Arquivar", f"Erro ao arquivar estabelecimentos: {e}")
+            return
+        finally:
+            if not estava_anexado:
+                self.detach_arquivo()
+
+        try:
+            # Devolve ao sistema as páginas liberadas, reduzindo o banco principal e seus backups
+            self.cursor.execute("VACUUM main")
+        except sqlite3.Error as e:
+            print(f"Não foi possível compactar o banco de dados: {e}")
+
+        QMessageBox.information(parent_window, "Sucesso", f"{len(ids)} estabelecimento(s) arquivado(s) com sucesso!")
+        self.load_data_to_tree(*self.filtro_atual)
+
     # --- Funções para Pesquisar / Exportar ---
     def open_pesquisar_window(self):
         """Abre a janela de pesquisa e exportação de relatórios."""
@@ -472,6 +1075,10 @@ class VisaApp(QMainWindow):
 
         main_layout.addWidget(filter_buttons_frame)
 
+        self.incluir_arquivados_checkbox = QCheckBox("Incluir estabelecimentos arquivados")
+        self.incluir_arquivados_checkbox.toggled.connect(self.toggle_incluir_arquivados)
+        main_layout.addWidget(self.incluir_arquivados_checkbox)
+
         self.filter_options_frame = QWidget()
         self.filter_options_layout = QVBoxLayout()
         self.filter_options_frame.setLayout(self.filter_options_layout)
@@ -497,11 +1104,14 @@ class VisaApp(QMainWindow):
         export_buttons_frame.setLayout(export_layout)
         export_layout.addWidget(QPushButton("Exportar para PDF", clicked=self.export_to_pdf))
         export_layout.addWidget(QPushButton("Exportar Tudo para PDF", clicked=lambda: self.export_to_pdf(export_all=True)))
+        export_layout.addWidget(QPushButton("Ver Anexos", clicked=self.open_anexos_selecionado))
+        export_layout.addWidget(QPushButton("Arquivar Selecionados", clicked=self.arquivar_selecionados))
         main_layout.addWidget(export_buttons_frame)
 
         self.show_filter_todos() # Carrega todos os estabelecimentos por padrão
 
         dialog.exec_()
+        self.detach_arquivo()
         
     def show_filter_todos(self):
         self.clear_layout(self.filter_options_layout)
@@ -614,34 +1224,53 @@ class VisaApp(QMainWindow):
 
         self.filter_options_layout.addLayout(layout)
     
-    def load_data_to_tree(self, filter_by=None, filter_value=None):
-        """Carrega os dados do banco de dados para o QTreeWidget com ou sem filtro."""
-        self.tree_widget.clear()
-        query = "SELECT * FROM estabelecimentos"
+    def consultar_estabelecimentos(self, schema="main", filter_by=None, filter_value=None):
+        """Retorna os estabelecimentos do banco principal ('main') ou do arquivo ('arquivo'), com ou sem filtro."""
+        query = f"SELECT * FROM {schema}.estabelecimentos"
         params = []
 
         if filter_by and filter_value:
             query += f" WHERE {filter_by} LIKE ?"
             params.append(f"%{filter_value}%")
-            
+
         self.cursor.execute(query, params)
-        data = self.cursor.fetchall()
+        return self.cursor.fetchall()
 
-        for row in data:
+    def load_data_to_tree(self, filter_by=None, filter_value=None):
+        """Carrega os dados do banco de dados para o QTreeWidget com ou sem filtro."""
+        self.filtro_atual = (filter_by, filter_value)
+        self.tree_widget.clear()
+
+        for row in self.consultar_estabelecimentos("main", filter_by, filter_value):
             item = QTreeWidgetItem([str(col) if col is not None else "" for col in row])
             self.tree_widget.addTopLevelItem(item)
 
+        # O arquivo só é consultado quando anexado pela opção "Incluir estabelecimentos arquivados"
+        if self.arquivo_anexado:
+            for row in self.consultar_estabelecimentos("arquivo", filter_by, filter_value):
+                item = QTreeWidgetItem([str(col) if col is not None else "" for col in row])
+                item.setData(0, Qt.UserRole, True)
+                for i in range(self.tree_widget.columnCount()):
+                    item.setForeground(i, Qt.gray)
+                    item.setToolTip(i, "Estabelecimento arquivado")
+                self.tree_widget.addTopLevelItem(item)
+
     def export_to_pdf(self, export_all=False):
         """Exporta os dados selecionados ou todos para um arquivo PDF."""
         if export_all:
-            self.cursor.execute("SELECT * FROM estabelecimentos")
-            data_to_export = self.cursor.fetchall()
+            data_to_export = self.consultar_estabelecimentos("main")
+            arquivados = [False] * len(data_to_export)
+            if self.arquivo_anexado:
+                data_arquivo = self.consultar_estabelecimentos("arquivo")
+                data_to_export += data_arquivo
+                arquivados += [True] * len(data_arquivo)
         else:
             selected_items = self.tree_widget.selectedItems()
             if not selected_items:
                 QMessageBox.warning(self, "Exportação", "Por favor, selecione as linhas que deseja exportar.")
                 return
             data_to_export = [[item.text(i) for i in range(self.tree_widget.columnCount())] for item in selected_items]
+            arquivados = [bool(item.data(0, Qt.UserRole)) for item in selected_items]
 
         if not data_to_export:
             QMessageBox.information(self, "Exportação", "Não há dados para exportar.")
@@ -658,6 +1287,9 @@ class VisaApp(QMainWindow):
         title = Paragraph(f"Relatório de Estabelecimentos - {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['h1'])
         story.append(title)
         story.append(Paragraph("<br/>", styles['Normal']))
+        if any(arquivados):
+            story.append(Paragraph("Linhas em cinza: estabelecimentos arquivados (inativos).", styles['Normal']))
+            story.append(Paragraph("<br/>", styles['Normal']))
 
         headers = [self.tree_widget.headerItem().text(i) for i in range(self.tree_widget.columnCount())]
         
@@ -674,6 +1306,11 @@ class VisaApp(QMainWindow):
             ('GRID', (0, 0), (-1, -1), 1, colors.black),
             ('BOX', (0, 0), (-1, -1), 1, colors.black),
         ])
+        # Destaca os estabelecimentos arquivados, como na lista da pesquisa (linha 0 é o cabeçalho)
+        for row_index, arquivado in enumerate(arquivados, start=1):
+            if arquivado:
+                table_style.add('BACKGROUND', (0, row_index), (-1, row_index), colors.lightgrey)
+                table_style.add('TEXTCOLOR', (0, row_index), (-1, row_index), colors.dimgrey)
         
         table = Table(data, hAlign=TA_CENTER)
         table.setStyle(table_style)